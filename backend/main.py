@@ -1,17 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from dotenv import load_dotenv
+import logging
 import os
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Pipeline tracing is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
 from routes import chat, upload, ping
 
 app = FastAPI(
     title="BeanGPT Main Platform API",
     description="API for dry bean genetics research chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
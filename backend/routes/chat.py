@@ -2,12 +2,25 @@ from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import json
+import orjson
 import os
 from services.pipeline import answer_question_stream, generate_suggested_questions
+from utils.sse_coalescer import SSECoalescer
 
 router = APIRouter()
 
+def _sse_default(obj: Any):
+    # Values orjson can't encode natively, e.g. object-dtype arrays or pandas objects in Plotly figures
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """Serialize a payload as a server-sent event frame."""
+    return f"data: {orjson.dumps(payload, default=_sse_default, option=orjson.OPT_SERIALIZE_NUMPY).decode()}\n\n"
+
 class ChatRequest(BaseModel):
     question: str
     conversation_history: Optional[List[Dict[str, Any]]] = None
@@ -25,21 +38,29 @@ async def chat_endpoint(request: ChatRequest):
         # Get API key from environment
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
-            yield f"data: {json.dumps({'type': 'error', 'data': 'OpenAI API key not configured'})}\n\n"
+            yield sse_event({'type': 'error', 'data': 'OpenAI API key not configured'})
             return
         
-        # Stream the answer
-        full_answer = ""
+        # Stream the answer, merging token deltas into larger content frames
+        coalescer = SSECoalescer()
         for chunk in answer_question_stream(request.question, request.conversation_history, api_key):
             if chunk["type"] == "content":
-                full_answer += chunk["data"]
-                yield f"data: {json.dumps(chunk)}\n\n"
-            elif chunk["type"] == "metadata":
+                for text in coalescer.add(chunk["data"]):
+                    yield sse_event({"type": "content", "data": text})
+                continue
+            # Any other event marks a pause in the content stream (e.g. gene analysis after the
+            # answer), so release buffered content now rather than holding it through the pause
+            for text in coalescer.flush():
+                yield sse_event({"type": "content", "data": text})
+            if chunk["type"] == "metadata":
                 # Send final metadata (sources, genes, etc.)
-                yield f"data: {json.dumps(chunk)}\n\n"
+                yield sse_event(chunk)
+        
+        for text in coalescer.flush():
+            yield sse_event({"type": "content", "data": text})
         
         # Signal completion
-        yield f"data: {json.dumps({'type': 'done'})}\n\n"
+        yield sse_event({'type': 'done'})
     
     return StreamingResponse(
         generate(),
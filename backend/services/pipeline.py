@@ -1,26 +1,36 @@
 import os
+import logging
+import re
+import heapq
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from operator import itemgetter
+from cachetools import TTLCache
 from dotenv import load_dotenv
-from typing import List, Tuple, Dict, Any
-import json
+from typing import List, Tuple, Dict, Any, Optional
 import pandas as pd
 import torch
 import torch.nn.functional as F
 import numpy as np
 from pathlib import Path
 import orjson
-from openai import OpenAI
 from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModel
-from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics.pairwise import cosine_similarity
 
-from utils.ncbi_utils import extract_gene_mentions, map_to_gene_id, load_gene_db, load_uniprot_db
-from utils.bean_data import function_schema, answer_bean_query
+from utils.ncbi_utils import extract_gene_mentions, find_partial_gene_match, map_to_gene_ids, generate_gene_descriptions_with_gpt, load_gene_db, load_uniprot_db
+from utils.bean_data import function_schema, answer_bean_query, AMBIGUOUS_REFERENCE_RE
+from utils.embedding_batcher import EmbeddingBatcher
+from utils.openai_client import get_openai_client
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Config ---
 BGE_INDEX_NAME = "dry-bean-bge-abstract"
 PUBMEDBERT_INDEX_NAME = "dry-bean-pubmedbert-abstract"
@@ -28,23 +38,65 @@ BGE_MODEL = "BAAI/bge-base-en-v1.5"
 PUBMEDBERT_MODEL = "microsoft/BiomedNLP-PubMedBERT-base-uncased-abstract-fulltext"
 TOP_K = 8
 ALPHA = 0.6
-
-# Initialize OpenAI client
-# client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBED_CACHE_SIZE = 1024
+PINECONE_CACHE_SIZE = 512
+PINECONE_CACHE_TTL = int(os.getenv("PINECONE_CACHE_TTL", "3600"))
+PUBMEDBERT_MAX_BATCH = 32
+PUBMEDBERT_BATCH_WINDOW_MS = float(os.getenv("PUBMEDBERT_BATCH_WINDOW_MS", "5"))
+PUBMEDBERT_PAD_BUCKETS = (64, 128, 256, 512)
+PUBMEDBERT_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+# Streamed answer text is sent for gene extraction in paragraph-aligned segments of at least this size
+GENE_SEGMENT_MIN_CHARS = 600
+GENE_EXTRACTION_WORKERS = int(os.getenv("GENE_EXTRACTION_WORKERS", "4"))
+# Gene extraction is skipped for text with no identifier-like token (mixed letters and digits, or 2+ capitals)
+# and no mention of "gene"; bare numbers such as "[1]" citations and years don't count
+GENE_LIKE_RE = re.compile(r"\b(?=\w*[A-Za-z])(?=\w*\d)\w+\b|\b\w*[A-Z]\w*[A-Z]\w*\b|\b[Gg]enes?\b")
+# Questions scoring within this margin of the genetics decision boundary are sent to GPT-4o.
+# The anchor classifier hasn't been calibrated against GPT yet, so the default only decides
+# questions well past the anchors themselves; lower it once the debug logs show the two agree
+GENETICS_CLASSIFIER_MARGIN = float(os.getenv("GENETICS_CLASSIFIER_MARGIN", "0.1"))
 
 # Initialize Pinecone
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 if not PINECONE_API_KEY:
     raise ValueError("PINECONE_API_KEY environment variable is not set")
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# gRPC keeps one multiplexed HTTP/2 channel per index instead of separate REST round-trips.
+# It needs the optional extra (pip install "pinecone-client[grpc]==3.0.2"); without it we stay on REST
+pc = None
+if os.getenv("PINECONE_USE_GRPC", "false").lower() == "true":
+    try:
+        from pinecone.grpc import PineconeGRPC
+        pc = PineconeGRPC(api_key=PINECONE_API_KEY)
+    except ImportError:
+        logger.warning("PINECONE_USE_GRPC is set but pinecone-client[grpc] is not installed; using REST")
+if pc is None:
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+
+# Shared pool for fanning out independent encoder and Pinecone calls
+executor = ThreadPoolExecutor(max_workers=8)
+# Separate pool for per-segment gene extraction, so slow GPT calls can't starve retrieval for new queries
+gene_executor = ThreadPoolExecutor(max_workers=GENE_EXTRACTION_WORKERS)
 
 # --- Load Models ---
 bge_model = SentenceTransformer(BGE_MODEL)
 tokenizer = AutoTokenizer.from_pretrained(PUBMEDBERT_MODEL)
-pub_model = AutoModel.from_pretrained(PUBMEDBERT_MODEL)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# SDPA uses PyTorch's fused attention kernel instead of materializing the full score matrix.
+# Half precision halves memory traffic and engages tensor cores; pooling stays in FP32
+pub_model = AutoModel.from_pretrained(
+    PUBMEDBERT_MODEL,
+    attn_implementation="sdpa",
+    torch_dtype=torch.float16 if device.type == "cuda" else torch.float32,
+)
 pub_model.to(device).eval()
+if device.type == "cuda":
+    # Fixed padded shapes let Inductor replay cached CUDA graphs instead of dispatching from Python;
+    # each (batch, length) bucket gets its own static graph, so leave room for all of them
+    torch._dynamo.config.cache_size_limit = max(
+        torch._dynamo.config.cache_size_limit, len(PUBMEDBERT_BATCH_BUCKETS) * len(PUBMEDBERT_PAD_BUCKETS)
+    )
+    pub_model = torch.compile(pub_model, mode="reduce-overhead", dynamic=False)
 
 # Load gene databases
 GENE_DB_PATH = os.getenv("GENE_DB_PATH", "../data/NCBI_Filtered_Data_Enriched.xlsx")
@@ -53,23 +105,22 @@ RAG_FILE = os.getenv("RAG_FILE", "../data/summaries.jsonl")
 
 # Load gene data
 load_gene_db(GENE_DB_PATH)
-print(f"Loaded gene database from {GENE_DB_PATH}")
+logger.info("Loaded gene database from %s", GENE_DB_PATH)
 
 # Load UniProt data
 load_uniprot_db(UNIPROT_DB_PATH)
-print(f"Loaded UniProt database from {UNIPROT_DB_PATH}")
-
-# Load RAG data
-try:
-    with open(RAG_FILE, 'r', encoding='utf-8') as f:
-        rag_data = [json.loads(line) for line in f]
-except UnicodeDecodeError:
-    # Fallback to latin-1 if utf-8 fails
-    with open(RAG_FILE, 'r', encoding='latin-1') as f:
-        rag_data = [json.loads(line) for line in f]
+logger.info("Loaded UniProt database from %s", UNIPROT_DB_PATH)
 
 # --- RAG Context Loading ---
+def normalize_doi(doi: str) -> str:
+    doi = doi.strip().lower()
+    for prefix in ("https://doi.org/", "http://doi.org/"):
+        if doi.startswith(prefix):
+            return doi[len(prefix):]
+    return doi
+
 def load_rag_text_jsonl(path: Path) -> Dict[str, str]:
+    """Load RAG summaries keyed by normalized DOI so lookups need a single probe."""
     rag_lookup = {}
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -78,7 +129,7 @@ def load_rag_text_jsonl(path: Path) -> Dict[str, str]:
                 doi = record.get("doi") or record.get("source", "").replace(".pdf", "")
                 rag = record.get("summary", "")
                 if doi and rag:
-                    rag_lookup[doi.strip()] = rag.strip()
+                    rag_lookup[normalize_doi(doi)] = rag.strip()
     except UnicodeDecodeError:
         # Fallback to latin-1 if utf-8 fails
         with open(path, "r", encoding="latin-1") as f:
@@ -87,7 +138,7 @@ def load_rag_text_jsonl(path: Path) -> Dict[str, str]:
                 doi = record.get("doi") or record.get("source", "").replace(".pdf", "")
                 rag = record.get("summary", "")
                 if doi and rag:
-                    rag_lookup[doi.strip()] = rag.strip()
+                    rag_lookup[normalize_doi(doi)] = rag.strip()
     return rag_lookup
 
 RAG_LOOKUP = load_rag_text_jsonl(Path(RAG_FILE))
@@ -97,64 +148,289 @@ def get_rag_context_from_dois(dois: List[str]) -> Tuple[str, List[str]]:
     confirmed_dois = []
 
     for i, doi in enumerate(dois, 1):
-        if doi in RAG_LOOKUP:
-            summary = RAG_LOOKUP[doi]
-            context_blocks.append(f"[{i}] Source: {doi}\n{summary}")
-            confirmed_dois.append(doi)
+        summary = RAG_LOOKUP.get(normalize_doi(doi))
+        if summary is None:
+            continue
+        context_blocks.append(f"[{i}] Source: {doi}\n{summary}")
+        confirmed_dois.append(doi)
 
     return "\n\n".join(context_blocks), confirmed_dois
 
 # --- Embedding Functions ---
 def mean_pooling(last_hidden_state, attention_mask):
-    mask = attention_mask.unsqueeze(-1).expand(last_hidden_state.size()).float()
-    return (last_hidden_state * mask).sum(1) / mask.sum(1)
-
-def embed_query_pubmedbert(query: str) -> List[float]:
-    encoded = tokenizer(
-        query, return_tensors="pt", padding=True, truncation=True, max_length=512
-    )
+    mask = attention_mask.bool().unsqueeze(-1)
+    # Accumulate in FP32 so half-precision hidden states don't drift
+    summed = last_hidden_state.masked_fill(~mask, 0.0).sum(dim=1, dtype=torch.float32)
+    denom = attention_mask.sum(dim=1, keepdim=True).clamp_(min=1).to(summed.dtype)
+    return summed / denom
+
+def tokenize_pubmedbert(queries: List[str]):
+    # token_type_ids are all zeros for single-segment queries and BERT defaults to a zero buffer
+    # when they're omitted, so skip building and copying them
+    if device.type != "cuda":
+        # Pad to the longest query in the batch, rounded up to a multiple of 8 for aligned GEMM shapes;
+        # the attention mask keeps padding out of the pool
+        return tokenizer(
+            queries, return_tensors="pt", padding="longest", truncation=True, max_length=512,
+            pad_to_multiple_of=8, return_token_type_ids=False,
+        )
+    # The compiled model specializes per shape, so round batch size and length up to a few fixed buckets;
+    # filler rows are empty queries whose embeddings are dropped after the forward pass
+    batch = next((size for size in PUBMEDBERT_BATCH_BUCKETS if size >= len(queries)), len(queries))
+    queries = list(queries) + [""] * (batch - len(queries))
+    encoded = tokenizer(queries, truncation=True, max_length=512, return_token_type_ids=False)
+    longest = max(len(ids) for ids in encoded["input_ids"])
+    bucket = next(size for size in PUBMEDBERT_PAD_BUCKETS if size >= longest)
+    return tokenizer.pad(encoded, padding="max_length", max_length=bucket, return_tensors="pt")
+
+def embed_queries_pubmedbert(queries: List[str]) -> np.ndarray:
+    encoded = tokenize_pubmedbert(queries)
     input_ids = encoded["input_ids"].to(device)
     attention_mask = encoded["attention_mask"].to(device)
-    with torch.no_grad():
+    with torch.inference_mode():
         outputs = pub_model(input_ids=input_ids, attention_mask=attention_mask)
         pooled = mean_pooling(outputs.last_hidden_state, attention_mask)
         normalized = F.normalize(pooled, p=2, dim=1)
-        return normalized.cpu().numpy().tolist()[0]
-
-def query_pinecone(index_name: str, vector: List[float]):
-    return pc.Index(index_name).query(vector=vector, top_k=TOP_K, include_metadata=True)
+        return normalized[:len(queries)].cpu().numpy()
+
+def warmup_pubmedbert():
+    """Compile and record every (batch, length) bucket up front so live requests never trigger a recompile."""
+    with torch.inference_mode():
+        for batch in PUBMEDBERT_BATCH_BUCKETS:
+            for length in PUBMEDBERT_PAD_BUCKETS:
+                input_ids = torch.full((batch, length), tokenizer.pad_token_id, dtype=torch.long, device=device)
+                attention_mask = torch.ones((batch, length), dtype=torch.long, device=device)
+                # CUDA graphs are recorded on the run after the first, so run each shape twice
+                for _ in range(2):
+                    pub_model(input_ids=input_ids, attention_mask=attention_mask)
+
+if device.type == "cuda":
+    warmup_pubmedbert()
+    logger.info("Warmed up PubMedBERT for %d input shapes", len(PUBMEDBERT_BATCH_BUCKETS) * len(PUBMEDBERT_PAD_BUCKETS))
+
+# Concurrent chat requests share one PubMedBERT forward pass
+pubmedbert_batcher = EmbeddingBatcher(
+    embed_queries_pubmedbert,
+    max_batch=PUBMEDBERT_MAX_BATCH,
+    window_s=PUBMEDBERT_BATCH_WINDOW_MS / 1000,
+)
+
+@lru_cache(maxsize=EMBED_CACHE_SIZE)
+def _cached_embedding(model_name: str, query: str) -> np.ndarray:
+    """Embed a normalized query once per model; repeated questions skip the forward pass."""
+    if model_name == BGE_MODEL:
+        vector = bge_model.encode(query, normalize_embeddings=True)
+    else:
+        vector = pubmedbert_batcher.embed(query)
+    vector = np.asarray(vector, dtype=np.float32)
+    # Cached arrays are shared between requests, so guard them against in-place edits
+    vector.setflags(write=False)
+    return vector
+
+def _cache_key(query: str) -> str:
+    # Both encoders are uncased, so case and surrounding whitespace don't change the embedding
+    return query.strip().lower()
+
+def embed_query_bge(query: str) -> np.ndarray:
+    return _cached_embedding(BGE_MODEL, _cache_key(query))
+
+def embed_query_pubmedbert(query: str) -> np.ndarray:
+    return _cached_embedding(PUBMEDBERT_MODEL, _cache_key(query))
+
+@lru_cache(maxsize=8)
+def get_index(index_name: str):
+    """Resolve a Pinecone index handle once and reuse it across queries."""
+    return pc.Index(index_name)
+
+# Repeat questions embed to identical vectors, so their matches can be reused for a while
+pinecone_cache = TTLCache(maxsize=PINECONE_CACHE_SIZE, ttl=PINECONE_CACHE_TTL)
+pinecone_cache_lock = threading.Lock()
+
+def query_pinecone(index_name: str, vector: np.ndarray):
+    key = (index_name, hashlib.sha256(vector.tobytes()).hexdigest())
+    with pinecone_cache_lock:
+        cached = pinecone_cache.get(key)
+    if cached is not None:
+        return cached
+    # Convert to a list only at the SDK boundary
+    result = get_index(index_name).query(vector=vector.tolist(), top_k=TOP_K, include_metadata=True)
+    with pinecone_cache_lock:
+        pinecone_cache[key] = result
+    return result
 
 def normalize_scores(matches):
+    # Min-max scaling over top_k scores; plain Python beats building an sklearn scaler here
     scores = [m["score"] for m in matches]
-    if not scores or max(scores) == min(scores):
+    if not scores:
+        return {}
+    lo, hi = min(scores), max(scores)
+    if hi == lo:
         return {m["metadata"].get("doi", f"{m['id']}"): 0.0 for m in matches}
-    norm = MinMaxScaler().fit_transform(np.array(scores).reshape(-1, 1)).flatten()
+    inv = 1.0 / (hi - lo)
     return {
-        m["metadata"].get("doi", f"{m['id']}"): norm[i] for i, m in enumerate(matches)
+        m["metadata"].get("doi", f"{m['id']}"): (score - lo) * inv
+        for m, score in zip(matches, scores)
     }
 
 def combine_scores(bge_scores: dict, pub_scores: dict, alpha: float = ALPHA) -> dict:
-    all_sources = set(bge_scores) | set(pub_scores)
-    combined = {}
-    for src in all_sources:
-        bge_val = bge_scores.get(src, 0.0)
-        pub_val = pub_scores.get(src, 0.0)
-        score = alpha * bge_val + (1 - alpha) * pub_val
-        if score > 0.05:
-            combined[src] = score
-    return combined
+    # Accumulate both weighted score maps into one dict, then apply the threshold once
+    combined = {src: alpha * score for src, score in bge_scores.items()}
+    beta = 1 - alpha
+    for src, score in pub_scores.items():
+        combined[src] = combined.get(src, 0.0) + beta * score
+    return {src: score for src, score in combined.items() if score > 0.05}
+
+def embed_question(question: str) -> Tuple[np.ndarray, np.ndarray]:
+    # The two encoders are independent, so run them concurrently
+    bge_future = executor.submit(embed_query_bge, question)
+    pub_future = executor.submit(embed_query_pubmedbert, question)
+    return bge_future.result(), pub_future.result()
+
+def search_indexes(bge_vec: np.ndarray, pub_vec: np.ndarray):
+    # Both Pinecone round-trips overlap, so latency is the slower query rather than the sum
+    bge_future = executor.submit(query_pinecone, BGE_INDEX_NAME, bge_vec)
+    pub_future = executor.submit(query_pinecone, PUBMEDBERT_INDEX_NAME, pub_vec)
+    return bge_future.result(), pub_future.result()
+
+def rank_sources(bge_res, pub_res) -> List[str]:
+    bge_scores = normalize_scores(bge_res["matches"])
+    pub_scores = normalize_scores(pub_res["matches"])
+    combined_scores = combine_scores(bge_scores, pub_scores)
+
+    # Partial selection instead of a full sort; same order as sorted(..., reverse=True)[:TOP_K]
+    top_sources = heapq.nlargest(TOP_K, combined_scores.items(), key=itemgetter(1))
+    return [src for src, _ in top_sources]
+
+# --- Bean Data Routing ---
+# A question naming a trial measurement together with a data verb clearly wants query_bean_data
+BEAN_DATA_TERMS_RE = re.compile(r"\b(?:yields?|maturity|cultivars?|variet(?:y|ies))\b")
+BEAN_DATA_ACTIONS_RE = re.compile(r"\b(?:show|compare|plot|chart|graph|list|top|best|highest|lowest|average|rank)\b")
+
+BEAN_ROUTER_SYSTEM = "You are a dry bean research platform. If the user asks for bean performance data, charts, or cultivar analysis, call the appropriate function."
+
+BEAN_ANALYST_SYSTEM = (
+    "You are a dry bean research assistant analyzing Ontario research station data. "
+    "IMPORTANT: This dataset contains Ontario bean trial data from research stations (WOOD, WINC, STHM, etc.) - NOT global country data. "
+    "Do not refer to this as 'sample data' - this is the complete dataset available. "
+    "Provide a comprehensive analysis of the data results in clean professional markdown. "
+    "Use **bold** for key findings, bullet points for lists, and reference the data directly. "
+    "If the user asks for global/world data, clarify that this dataset contains Ontario research station data only."
+)
+
+# Longer dataset previews are cut to their head and tail before the analyst summary call
+PREVIEW_MAX_CHARS = 6000
+PREVIEW_HEAD_CHARS = 4000
+PREVIEW_TAIL_CHARS = 1500
+
+def truncate_preview(preview: str) -> str:
+    """Keep the start and end of a long dataset preview to bound summary input tokens."""
+    if len(preview) < PREVIEW_MAX_CHARS:
+        return preview
+    return preview[:PREVIEW_HEAD_CHARS] + "\n...[truncated middle]...\n" + preview[-PREVIEW_TAIL_CHARS:]
+
+# Function definitions for the router call, built once rather than wrapping the schema per request
+BEAN_FUNCTIONS = [function_schema]
+
+# Static message prefixes, built once so every request sends a byte-identical (cacheable) prompt prefix
+BEAN_ROUTER_MSGS_BASE = [{"role": "system", "content": BEAN_ROUTER_SYSTEM}]
+BEAN_ANALYST_MSGS_BASE = [{"role": "system", "content": BEAN_ANALYST_SYSTEM}]
+
+def should_call_bean_function(q_lower: str) -> bool:
+    """Rule-based router for unambiguous bean data requests."""
+    return bool(BEAN_DATA_TERMS_RE.search(q_lower) and BEAN_DATA_ACTIONS_RE.search(q_lower))
+
+def route_bean_query(question: str, q_lower: str, conversation_history: Optional[List[Dict]], client) -> Optional[Dict]:
+    """
+    Decide whether to query the bean dataset and return the function arguments, or None.
+    Clear-cut, self-contained requests skip the router LLM call; follow-ups and references
+    like "that cultivar" go to GPT so it can fill in arguments from the conversation history.
+    """
+    if not conversation_history and not AMBIGUOUS_REFERENCE_RE.search(q_lower) and should_call_bean_function(q_lower):
+        return {}
+
+    # Let GPT decide whether to call the bean function, with conversation history for context
+    function_call_messages = BEAN_ROUTER_MSGS_BASE + (conversation_history or []) + [{"role": "user", "content": question}]
+    
+    response = client.chat.completions.create(
+        model="gpt-4o",
+        messages=function_call_messages,
+        functions=BEAN_FUNCTIONS,
+        function_call="auto",
+    )
+
+    choice = response.choices[0]
+    if choice.finish_reason == "function_call" and choice.message.function_call.name == "query_bean_data":
+        return orjson.loads(choice.message.function_call.arguments)
+    return None
+
+def _route_and_answer_bean(question: str, q_lower: str, conversation_history: Optional[List[Dict]], client, api_key: str) -> Tuple[str, str, Dict, bool]:
+    """
+    Route a bean-keyword question and run the dataset query if it applies.
+    Returns (preview, full_md, chart_data, used); used is False when the question was left to the literature search.
+    """
+    bean_args = route_bean_query(question, q_lower, conversation_history, client)
+    if bean_args is None:
+        return "", "", {}, False
+    bean_args['original_question'] = question
+    bean_args['api_key'] = api_key
+    preview, full_md, chart_data = answer_bean_query(bean_args)
+    return preview, full_md, chart_data, True
 
 # --- Question Processing ---
+# Substring keywords for broader detection of bean data analysis questions
+BEAN_KEYWORDS = frozenset(["yield", "maturity", "cultivar", "variety", "performance", "bean", "production", "steam", "lighthouse", "seal"])
+# One compiled scan over the question; substring semantics match the old any() scan
+BEAN_KEYWORD_RE = re.compile("|".join(re.escape(k) for k in sorted(BEAN_KEYWORDS, key=len, reverse=True)))
+
+GENETICS_ANCHORS = [
+    "Which genes control disease resistance in common bean?",
+    "What is the function of this transcription factor?",
+    "Which QTL are associated with drought tolerance?",
+    "How is gene expression regulated under heat stress?",
+    "What molecular markers are linked to seed coat color?",
+    "Explain the role of this protein in nitrogen fixation.",
+    "Which genomic regions are involved in flowering time?",
+    "What does the Phg gene do in Phaseolus vulgaris?",
+    "How do MYB and WRKY genes respond to pathogens?",
+    "What metabolic pathway produces anthocyanins in beans?",
+]
+NON_GENETICS_ANCHORS = [
+    "Which cultivar had the highest yield last year?",
+    "Show me a chart of average yield by location.",
+    "Compare maturity days between two varieties.",
+    "What were the trial results at Woodstock in 2020?",
+    "Plot yield trends over time for white beans.",
+    "Which location performed best for coloured beans?",
+    "List the top five varieties by yield.",
+    "How many trials were run at each research station?",
+    "What is the average maturity of navy bean cultivars?",
+    "Create a bar graph of cultivar performance.",
+]
+
+# Anchors are embedded once at startup; classifying a question is then a single dot product
+_genetics_pos = bge_model.encode(GENETICS_ANCHORS, normalize_embeddings=True).mean(axis=0)
+_genetics_neg = bge_model.encode(NON_GENETICS_ANCHORS, normalize_embeddings=True).mean(axis=0)
+GENETICS_DIRECTION = _genetics_pos - _genetics_neg
+GENETICS_BIAS = float((_genetics_pos + _genetics_neg) @ GENETICS_DIRECTION) / 2
+
+def genetics_score(question: str) -> float:
+    """Signed distance of the question from the genetics/non-genetics midpoint (positive = genetics)."""
+    return float(embed_query_bge(question) @ GENETICS_DIRECTION) - GENETICS_BIAS
+
 def is_genetics_question(question: str, api_key: str) -> bool:
     """
-    Determine if a question is about genetics/molecular biology using OpenAI.
-    Now requires user-provided API key.
+    Determine if a question is about genetics/molecular biology.
+    Confident cases are decided locally with BGE anchor embeddings; borderline ones ask OpenAI.
     """
+    score = genetics_score(question)
+    if abs(score) >= GENETICS_CLASSIFIER_MARGIN:
+        return score > 0
+
     api_key = api_key or os.getenv("OPENAI_API_KEY")  # fallback to env var
     if not api_key:
         raise ValueError("OpenAI API key is required")
     
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     try:
         response = client.chat.completions.create(
@@ -178,59 +454,59 @@ def is_genetics_question(question: str, api_key: str) -> bool:
         )
         
         result = response.choices[0].message.content.strip().lower()
+        # Logged with the local score so the margin can be tuned from real traffic
+        logger.debug("Genetics classifier: local score %.4f, GPT says %s", score, result)
         return result == "true"
     except Exception as e:
-        print(f"Error in genetics classification: {e}")
+        logger.error("Error in genetics classification: %s", e)
         return False
 
-def query_openai(context: str, source_list: List[str], question: str, conversation_history: List[Dict] = None, api_key: str = None) -> str:
-    # Create client with user-provided API key
-    api_key = api_key or os.getenv("OPENAI_API_KEY")  # fallback to env var
-    if not api_key:
-        raise ValueError("OpenAI API key is required")
-    
-    client = OpenAI(api_key=api_key)
-    
+# --- Prompts ---
+RAG_SYSTEM_PROMPT = (
+    "You are a dry bean genetics and genomics research platform. Your goal is to provide expert-level, "
+    "evidence-backed answers to plant science questions.\n"
+    "Prioritize high information density and clarity over brevity. Be thorough and precise in explaining "
+    "genetic traits, gene functions, and cultivar-level differences.\n\n"
+
+    "Format answers in clean, professional markdown:\n"
+    "- Use **bold** for key findings, metrics, or gene names\n"
+    "- Use *italics* for scientific terms and species names\n"
+    "- Use bullet points (•) for lists\n"
+    "- Use tables where helpful\n"
+    "- Separate sections with headers when there's a topic shift\n"
+    "- Include inline citations like [1], [2] to reference the provided context\n"
+    "- DO NOT include a references section at the end - references will be handled separately\n\n"
+
+    "Avoid vague statements. If context is lacking, say so, then supplement with well-established knowledge "
+    "clearly labeled as general background.\n\n"
+
+    "Focus on providing comprehensive scientific information without including reference lists."
+)
+
+# Used when the question is a follow-up to a successful bean data analysis
+RAG_BEAN_FOLLOWUP_SYSTEM_PROMPT = (
+    "You are a dry bean genetics and genomics research platform. The user has already completed "
+    "a successful data analysis with charts and visualizations. Your role is to provide complementary "
+    "research context from scientific literature about the biological and genetic factors underlying "
+    "the analysis.\n\n"
+
+    "Focus on:\n"
+    "- Genetic mechanisms related to the traits being analyzed\n"
+    "- Breeding implications and cultivar development insights\n"
+    "- Research findings that explain the biological basis of the data patterns\n"
+    "- Molecular markers and genomic studies relevant to the analysis\n\n"
+
+    "Format answers in clean, professional markdown with inline citations [1], [2] to reference sources.\n"
+    "Do NOT repeat the data analysis or charts - focus on research insights that complement the completed analysis."
+)
+
+def build_rag_messages(context: str, question: str, conversation_history: List[Dict] = None) -> List[Dict]:
     # Adjust system prompt based on whether this is a follow-up to bean data analysis
-    system_content = (
-        "You are a dry bean genetics and genomics research platform. Your goal is to provide expert-level, "
-                "evidence-backed answers to plant science questions.\n"
-                "Prioritize high information density and clarity over brevity. Be thorough and precise in explaining "
-                "genetic traits, gene functions, and cultivar-level differences.\n\n"
-
-                "Format answers in clean, professional markdown:\n"
-                "- Use **bold** for key findings, metrics, or gene names\n"
-                "- Use *italics* for scientific terms and species names\n"
-                "- Use bullet points (•) for lists\n"
-                "- Use tables where helpful\n"
-                "- Separate sections with headers when there's a topic shift\n"
-                "- Include inline citations like [1], [2] to reference the provided context\n"
-                "- DO NOT include a references section at the end - references will be handled separately\n\n"
-
-                "Avoid vague statements. If context is lacking, say so, then supplement with well-established knowledge "
-                "clearly labeled as general background.\n\n"
-
-                "Focus on providing comprehensive scientific information without including reference lists."
-    )
-    
-    # If this is a follow-up to successful bean data analysis, adjust the prompt
     if "We successfully analyzed the bean data" in question:
-        system_content = (
-            "You are a dry bean genetics and genomics research platform. The user has already completed "
-            "a successful data analysis with charts and visualizations. Your role is to provide complementary "
-            "research context from scientific literature about the biological and genetic factors underlying "
-            "the analysis.\n\n"
-            
-            "Focus on:\n"
-            "- Genetic mechanisms related to the traits being analyzed\n"
-            "- Breeding implications and cultivar development insights\n"
-            "- Research findings that explain the biological basis of the data patterns\n"
-            "- Molecular markers and genomic studies relevant to the analysis\n\n"
-            
-            "Format answers in clean, professional markdown with inline citations [1], [2] to reference sources.\n"
-            "Do NOT repeat the data analysis or charts - focus on research insights that complement the completed analysis."
-        )
-    
+        system_content = RAG_BEAN_FOLLOWUP_SYSTEM_PROMPT
+    else:
+        system_content = RAG_SYSTEM_PROMPT
+
     messages = [
         {
             "role": "system",
@@ -247,6 +523,16 @@ def query_openai(context: str, source_list: List[str], question: str, conversati
         "role": "user",
         "content": f"Context:\n{context}\n\nQuestion: {question}\n\nAnswer using the context provided. Include the bracketed numbers inline.",
     })
+    return messages
+
+def query_openai(context: str, source_list: List[str], question: str, conversation_history: List[Dict] = None, api_key: str = None) -> str:
+    # Create client with user-provided API key
+    api_key = api_key or os.getenv("OPENAI_API_KEY")  # fallback to env var
+    if not api_key:
+        raise ValueError("OpenAI API key is required")
+    
+    client = get_openai_client(api_key)
+    messages = build_rag_messages(context, question, conversation_history)
 
     response = client.chat.completions.create(
         model="gpt-4o", messages=messages, temperature=0.2
@@ -259,64 +545,8 @@ def query_openai_stream(context: str, source_list: List[str], question: str, con
     if not api_key:
         raise ValueError("OpenAI API key is required")
     
-    client = OpenAI(api_key=api_key)
-    
-    # Adjust system prompt based on whether this is a follow-up to bean data analysis
-    system_content = (
-        "You are a dry bean genetics and genomics research platform. Your goal is to provide expert-level, "
-                "evidence-backed answers to plant science questions.\n"
-                "Prioritize high information density and clarity over brevity. Be thorough and precise in explaining "
-                "genetic traits, gene functions, and cultivar-level differences.\n\n"
-
-                "Format answers in clean, professional markdown:\n"
-                "- Use **bold** for key findings, metrics, or gene names\n"
-                "- Use *italics* for scientific terms and species names\n"
-                "- Use bullet points (•) for lists\n"
-                "- Use tables where helpful\n"
-                "- Separate sections with headers when there's a topic shift\n"
-                "- Include inline citations like [1], [2] to reference the provided context\n"
-                "- DO NOT include a references section at the end - references will be handled separately\n\n"
-
-                "Avoid vague statements. If context is lacking, say so, then supplement with well-established knowledge "
-                "clearly labeled as general background.\n\n"
-
-                "Focus on providing comprehensive scientific information without including reference lists."
-    )
-    
-    # If this is a follow-up to successful bean data analysis, adjust the prompt
-    if "We successfully analyzed the bean data" in question:
-        system_content = (
-            "You are a dry bean genetics and genomics research platform. The user has already completed "
-            "a successful data analysis with charts and visualizations. Your role is to provide complementary "
-            "research context from scientific literature about the biological and genetic factors underlying "
-            "the analysis.\n\n"
-            
-            "Focus on:\n"
-            "- Genetic mechanisms related to the traits being analyzed\n"
-            "- Breeding implications and cultivar development insights\n"
-            "- Research findings that explain the biological basis of the data patterns\n"
-            "- Molecular markers and genomic studies relevant to the analysis\n\n"
-            
-            "Format answers in clean, professional markdown with inline citations [1], [2] to reference sources.\n"
-            "Do NOT repeat the data analysis or charts - focus on research insights that complement the completed analysis."
-        )
-    
-    messages = [
-        {
-            "role": "system",
-            "content": system_content,
-        }
-    ]
-
-    # Add conversation history if available
-    if conversation_history:
-        messages.extend(conversation_history)
-
-    # Add the current context and question
-    messages.append({
-        "role": "user",
-        "content": f"Context:\n{context}\n\nQuestion: {question}\n\nAnswer using the context provided. Include the bracketed numbers inline.",
-    })
+    client = get_openai_client(api_key)
+    messages = build_rag_messages(context, question, conversation_history)
 
     try:
         response = client.chat.completions.create(
@@ -331,7 +561,7 @@ def query_openai_stream(context: str, source_list: List[str], question: str, con
             if chunk.choices[0].delta.content is not None:
                 yield chunk.choices[0].delta.content
     except Exception as e:
-        print(f"❌ OpenAI streaming error: {e}")
+        logger.error("❌ OpenAI streaming error: %s", e)
         yield f"\n\n*Error generating response: {str(e)}*\n\n"
 
 def generate_suggested_questions(
@@ -345,10 +575,10 @@ def generate_suggested_questions(
     # Get API key from environment
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        print("No OpenAI API key found, skipping suggested questions generation")
+        logger.warning("No OpenAI API key found, skipping suggested questions generation")
         return []
     
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     prompt = (
         "Based on the following assistant response (answer and potentially data/sources), "
@@ -391,9 +621,82 @@ def generate_suggested_questions(
         # Split the comma-separated list into a Python list
         return [q.strip() for q in suggested_questions_text.split(',') if q.strip()]
     except Exception as e:
-        print(f"Error generating suggested questions: {e}")
+        logger.error("Error generating suggested questions: %s", e)
         return []
 
+def summarize_gene(gene: str, gene_info: Optional[Dict]) -> Dict:
+    """Build the gene card shown in the UI from a database (or generated) lookup result."""
+    if not gene_info:
+        # Gene identified but not found in any database
+        return {
+            "name": gene,
+            "summary": f"- Genetic element mentioned in context\n- No database match found",
+            "source": "Literature Reference",
+            "description": f"This genetic element was identified in the research context but could not be matched to existing databases.",
+            "not_found": True
+        }
+    if gene_info["source"] == "NCBI":
+        preview_url = f"https://www.ncbi.nlm.nih.gov/gene/{gene_info['gene_id']}"
+        return {
+            "name": gene,
+            "summary": f"![NCBI Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
+            "link": preview_url,
+            "source": "NCBI Gene Database",
+            "description": gene_info['description']
+        }
+    if gene_info["source"] == "UniProt":
+        preview_url = f"https://www.uniprot.org/uniprotkb/{gene_info['entry']}"
+        return {
+            "name": gene,
+            "summary": f"![UniProt Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
+            "link": preview_url,
+            "source": "UniProt Protein Database",
+            "description": gene_info['description']
+        }
+    if gene_info["source"] == "GPT-4o":
+        return {
+            "name": gene,
+            "summary": f"- {gene_info['description']}\n- Generated by AI analysis",
+            "source": "AI Analysis",
+            "description": gene_info['description'],
+            "generated": True
+        }
+    return {
+        "name": gene,
+        "summary": f"- Description: `{gene_info['description']}`\n- Source: {gene_info['source']}",
+        "source": gene_info['source'],
+        "description": gene_info['description']
+    }
+
+def process_genes_batch(gene_mentions: List[str]) -> List[Dict]:
+    """Look up all mentioned genes, resolving NCBI symbol hits in bulk and the rest one by one."""
+    if not gene_mentions:
+        return []
+    gene_infos = map_to_gene_ids(gene_mentions)
+    # Misses go through the partial NCBI and UniProt scans only; these are CPU-bound pandas work
+    # that threads can't speed up, so they run serially rather than occupying the retrieval pool
+    misses = [gene for gene, info in gene_infos.items() if info is None]
+    gene_infos.update((gene, find_partial_gene_match(gene)) for gene in misses)
+    # Whatever neither database knows is described by GPT in a single request
+    unknown = [gene for gene in misses if gene_infos[gene] is None]
+    gene_infos.update(generate_gene_descriptions_with_gpt(unknown))
+    return [summarize_gene(gene, gene_infos[gene]) for gene in gene_mentions]
+
+def has_gene_like_token(text: str) -> bool:
+    return bool(text.strip()) and GENE_LIKE_RE.search(text) is not None
+
+def merge_gene_mentions(mention_lists) -> List[str]:
+    """Merge per-segment gene mentions, keeping first-seen order and dropping case-insensitive repeats."""
+    seen = set()
+    merged = []
+    for mentions in mention_lists:
+        for gene in mentions:
+            key = gene.lower()
+            if key not in seen:
+                seen.add(key)
+                merged.append(gene)
+    return merged
+
 def answer_question_stream(question: str, conversation_history: List[Dict] = None, api_key: str = None):
     """
     Stream the answer to a question with progress updates.
@@ -407,7 +710,7 @@ def answer_question_stream(question: str, conversation_history: List[Dict] = Non
         raise ValueError("OpenAI API key is required")
     
     # Create client with user-provided API key
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     # Initialize bean data variables
     bean_chart_data = {}
@@ -422,143 +725,90 @@ def answer_question_stream(question: str, conversation_history: List[Dict] = Non
     
     # Check if this is a genetics question
     is_genetic = is_genetics_question(question, api_key)
-    print(f"🧪 Is this a genetics question? {is_genetic}")
+    logger.debug("🧪 Is this a genetics question? %s", is_genetic)
     
     yield {"type": "progress", "data": {"step": "analysis", "detail": "Analyzing question type"}}
 
     if not is_genetic:
         yield {"type": "progress", "data": {"step": "dataset", "detail": "Checking cultivar database"}}
         
-        # Check for bean data keywords - broader detection for data analysis
-        bean_keywords = ["yield", "maturity", "cultivar", "variety", "performance", "bean", "production", "steam", "lighthouse", "seal"]
-        chart_keywords = ["chart", "plot", "graph", "visualization", "visualize", "show me", "create", "generate"]
-        
         # Trigger bean data analysis for relevant questions
-        has_bean_keywords = any(keyword in question.lower() for keyword in bean_keywords)
-        explicitly_wants_chart = any(keyword in question.lower() for keyword in chart_keywords)
+        q_lower = question.lower()
+        has_bean_keywords = BEAN_KEYWORD_RE.search(q_lower) is not None
         
         if has_bean_keywords:
-            # Let GPT decide whether to call the bean function
-            function_call_messages = [
-                {
-                    "role": "system",
-                    "content": "You are a dry bean research platform. If the user asks for bean performance data, charts, or cultivar analysis, call the appropriate function."
-                }
-            ]
-            
-            # Add conversation history for context
-            if conversation_history:
-                function_call_messages.extend(conversation_history)
-            
-            function_call_messages.append({"role": "user", "content": question})
-            
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=function_call_messages,
-                functions=[function_schema],
-                function_call="auto",
-            )
-
-            choice = response.choices[0]
-            if choice.finish_reason == "function_call":
-                yield {"type": "progress", "data": {"step": "processing", "detail": "Processing cultivar data"}}
-                
-                call = choice.message.function_call
-                if call.name == "query_bean_data":
-                    args = json.loads(call.arguments)
-                    args['original_question'] = question
-                    args['api_key'] = api_key
-                    preview, full_md, chart_data = answer_bean_query(args)
-                    
-                    if preview and not preview.strip().startswith("## 🔍 **Dataset Query Results**\n\nNo matching"):
-                        yield {"type": "progress", "data": {"step": "dataset_success", "detail": "Found matching data"}}
-                        
-                        # Generate natural language summary
-                        yield {"type": "progress", "data": {"step": "generation", "detail": "Creating analysis summary"}}
-                        
-                        summary_response = client.chat.completions.create(
-                            model="gpt-4o",
-                            messages=[
-                                {
-                                    "role": "system",
-                                    "content": (
-                                        "You are a dry bean research assistant analyzing Ontario research station data. "
-                                        "IMPORTANT: This dataset contains Ontario bean trial data from research stations (WOOD, WINC, STHM, etc.) - NOT global country data. "
-                                        "Do not refer to this as 'sample data' - this is the complete dataset available. "
-                                        "Provide a comprehensive analysis of the data results in clean professional markdown. "
-                                        "Use **bold** for key findings, bullet points for lists, and reference the data directly. "
-                                        "If the user asks for global/world data, clarify that this dataset contains Ontario research station data only."
-                                    ),
-                                },
-                                {
-                                    "role": "user",
-                                    "content": f"Based on the question '{question}', analyze this data:\n\n{preview}"
-                                }
-                            ],
-                            temperature=0.3,
-                        )
-                        
-                        final_answer = summary_response.choices[0].message.content.strip()
-                        
-                        # Stream the complete answer
-                        for char in final_answer:
-                            yield {"type": "content", "data": char}
-                        
-                        # Store bean data for later metadata
-                        bean_chart_data = chart_data
-                        bean_full_md = full_md
-                        bean_data_found = True
-                        
-                        # Continue with research literature search
-                        yield {"type": "progress", "data": {"step": "literature_search", "detail": "Searching research papers for additional insights"}}
-                        
-                        # Add transition to literature search
-                        transition_text = "\n\n---\n\n## 📚 **Related Research Literature**\n\nSearching scientific publications for additional context and insights...\n\n"
-                        for char in transition_text:
-                            yield {"type": "content", "data": char}
-                    else:
-                        # No data found, fall back to literature search
-                        yield {"type": "progress", "data": {"step": "fallback", "detail": "No data found, searching literature"}}
-                        bean_chart_data = {}
-                        bean_full_md = ""
+            yield {"type": "progress", "data": {"step": "processing", "detail": "Processing cultivar data"}}
+            preview, full_md, chart_data, used = _route_and_answer_bean(question, q_lower, conversation_history, client, api_key)
+            if used:
+
+                if preview and not preview.strip().startswith("## 🔍 **Dataset Query Results**\n\nNo matching"):
+                    yield {"type": "progress", "data": {"step": "dataset_success", "detail": "Found matching data"}}
+
+                    # Generate natural language summary
+                    yield {"type": "progress", "data": {"step": "generation", "detail": "Creating analysis summary"}}
+
+                    summary_response = client.chat.completions.create(
+                        model="gpt-4o",
+                        messages=BEAN_ANALYST_MSGS_BASE + [
+                            {
+                                "role": "user",
+                                "content": f"Based on the question '{question}', analyze this data:\n\n{truncate_preview(preview)}"
+                            }
+                        ],
+                        temperature=0.3,
+                        stream=True,
+                    )
+
+                    # Forward summary tokens as they arrive instead of waiting for the full completion
+                    for chunk in summary_response:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            yield {"type": "content", "data": delta}
+
+                    # Store bean data for later metadata
+                    bean_chart_data = chart_data
+                    bean_full_md = full_md
+                    bean_data_found = True
+
+                    # Continue with research literature search
+                    yield {"type": "progress", "data": {"step": "literature_search", "detail": "Searching research papers for additional insights"}}
+
+                    # Add transition to literature search
+                    transition_text = "\n\n---\n\n## 📚 **Related Research Literature**\n\nSearching scientific publications for additional context and insights...\n\n"
+                    yield {"type": "content", "data": transition_text}
+                else:
+                    # No data found, fall back to literature search
+                    yield {"type": "progress", "data": {"step": "fallback", "detail": "No data found, searching literature"}}
+                    bean_chart_data = {}
+                    bean_full_md = ""
             else:
                 # GPT decided not to use function, continue to RAG
                 yield {"type": "progress", "data": {"step": "generation", "detail": "Proceeding to literature search"}}
                 
                 # Add transition to literature search
                 transition_text = "\n\n## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
-                for char in transition_text:
-                    yield {"type": "content", "data": char}
+                yield {"type": "content", "data": transition_text}
         else:
             # No bean keywords, proceed directly to research papers
             yield {"type": "progress", "data": {"step": "generation", "detail": "Proceeding to literature search"}}
             
             # Add transition to literature search
             transition_text = "\n\n## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
-            for char in transition_text:
-                yield {"type": "content", "data": char}
+            yield {"type": "content", "data": transition_text}
 
     # --- Genetics question flow ---
     yield {"type": "progress", "data": {"step": "embeddings", "detail": "Processing semantic embeddings"}}
     
-    bge_vec = bge_model.encode(question, normalize_embeddings=True).tolist()
-    pub_vec = embed_query_pubmedbert(question)
+    bge_vec, pub_vec = embed_question(question)
     
     yield {"type": "progress", "data": {"step": "search", "detail": "Searching literature database"}}
     
-    bge_res = query_pinecone(BGE_INDEX_NAME, bge_vec)
-    pub_res = query_pinecone(PUBMEDBERT_INDEX_NAME, pub_vec)
-
-    bge_scores = normalize_scores(bge_res["matches"])
-    pub_scores = normalize_scores(pub_res["matches"])
-    combined_scores = combine_scores(bge_scores, pub_scores)
-
-    top_sources = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:TOP_K]
-    top_dois = [src for src, _ in top_sources]
+    bge_res, pub_res = search_indexes(bge_vec, pub_vec)
+    top_dois = rank_sources(bge_res, pub_res)
     
     yield {"type": "progress", "data": {"step": "papers", "detail": f"Found {len(top_dois)} relevant papers"}}
     
-    print("🔎 Top DOIs from Pinecone:", top_dois)
+    logger.debug("🔎 Top DOIs from Pinecone: %s", top_dois)
 
     context, source_list = get_rag_context_from_dois(top_dois)
     
@@ -570,75 +820,34 @@ def answer_question_stream(question: str, conversation_history: List[Dict] = Non
     if bean_data_found:
         rag_question = f"We successfully analyzed the bean data for: '{question}'. Now provide additional research context from scientific literature about the genetic and biological factors related to this analysis."
     
+    # Extract genes from finished paragraphs while the rest of the answer is still streaming
+    gene_futures = []
+    segment = []
+    segment_len = 0
     for chunk in query_openai_stream(context, source_list, rag_question, conversation_history, api_key):
         yield {"type": "content", "data": chunk}
+        segment.append(chunk)
+        segment_len += len(chunk)
+        if segment_len >= GENE_SEGMENT_MIN_CHARS and "\n\n" in chunk:
+            # Cut at the paragraph break so no gene name straddles two segments
+            text = "".join(segment)
+            cut = text.rfind("\n\n") + 2
+            if has_gene_like_token(text[:cut]):
+                gene_futures.append(gene_executor.submit(extract_gene_mentions, text[:cut]))
+            segment = [text[cut:]]
+            segment_len = len(segment[0])
+    tail = "".join(segment)
+    if has_gene_like_token(tail):
+        gene_futures.append(gene_executor.submit(extract_gene_mentions, tail))
 
     yield {"type": "progress", "data": {"step": "genes", "detail": "Analyzing genetic elements"}}
 
-    # Get the full response for gene extraction (use same modified question as streaming)
-    rag_question = question
-    if bean_data_found:
-        rag_question = f"We successfully analyzed the bean data for: '{question}'. Now provide additional research context from scientific literature about the genetic and biological factors related to this analysis."
-    
-    full_response = query_openai(context, source_list, rag_question, conversation_history, api_key)
-    
-    # Extract genes from the complete answer
-    print("🧬 Extracting gene mentions...")
-    gene_mentions, db_hits, gpt_hits = extract_gene_mentions(full_response)
-    print(f"Found gene mentions: {gene_mentions}")
+    logger.debug("🧬 Extracting gene mentions...")
+    gene_mentions = merge_gene_mentions(future.result()[0] for future in gene_futures)
+    logger.debug("Found gene mentions: %s", gene_mentions)
 
     # Map genes to their summaries with preview URLs
-    gene_summaries = []
-    for gene in gene_mentions:
-        # db_hits now contains GPT genes that were validated against databases
-        # gpt_hits contains all GPT genes
-        # So we don't need the possible_flag logic anymore since all genes come from GPT
-        possible_flag = False
-        gene_info = map_to_gene_id(gene)
-        if gene_info:
-            if gene_info["source"] == "NCBI":
-                preview_url = f"https://www.ncbi.nlm.nih.gov/gene/{gene_info['gene_id']}"
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"![NCBI Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
-                    "link": preview_url,
-                    "source": "NCBI Gene Database" if not possible_flag else "NCBI Gene Database (Possible Match)",
-                    "description": gene_info['description']
-                })
-            elif gene_info["source"] == "UniProt":
-                preview_url = f"https://www.uniprot.org/uniprotkb/{gene_info['entry']}"
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"![UniProt Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
-                    "link": preview_url,
-                    "source": "UniProt Protein Database" if not possible_flag else "UniProt Protein Database (Possible Match)",
-                    "description": gene_info['description']
-                })
-            elif gene_info["source"] == "GPT-4o":
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"- {gene_info['description']}\n- Generated by AI analysis",
-                    "source": "AI Analysis" if not possible_flag else "AI Analysis (Possible Match)",
-                    "description": gene_info['description'],
-                    "generated": True
-                })
-            else:
-                source_label = gene_info['source'] if not possible_flag else f"Possible {gene_info['source']}"
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"- Description: `{gene_info['description']}`\n- Source: {source_label}",
-                    "source": source_label,
-                    "description": gene_info['description']
-                })
-        else:
-            # Gene identified but not found in any database
-            gene_summaries.append({
-                "name": gene,
-                "summary": f"- Genetic element mentioned in context\n- No database match found",
-                "source": "Literature Reference" if not possible_flag else "Literature Reference (Possible Match)",
-                "description": f"This genetic element was identified in the research context but could not be matched to existing databases.",
-                "not_found": True
-            })
+    gene_summaries = process_genes_batch(gene_mentions)
 
     genes = gene_summaries
 
@@ -669,69 +878,37 @@ def answer_question(question: str, conversation_history: List[Dict] = None, api_
         raise ValueError("OpenAI API key is required")
     
     is_genetic = is_genetics_question(question, api_key)
-    print(f"🧪 Is this a genetics question? {is_genetic}")
+    logger.debug("🧪 Is this a genetics question? %s", is_genetic)
     
     # Create client with user-provided API key
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     # Initialize transition_message
     transition_message = ""
 
     if not is_genetic:
-        # Check for bean data keywords - broader detection for data analysis
-        bean_keywords = ["yield", "maturity", "cultivar", "variety", "performance", "bean", "production", "steam", "lighthouse", "seal"]
-        chart_keywords = ["chart", "plot", "graph", "visualization", "visualize", "show me", "create", "generate"]
-        
         # Trigger bean data analysis for relevant questions
-        has_bean_keywords = any(keyword in question.lower() for keyword in bean_keywords)
-        explicitly_wants_chart = any(keyword in question.lower() for keyword in chart_keywords)
+        q_lower = question.lower()
+        has_bean_keywords = BEAN_KEYWORD_RE.search(q_lower) is not None
                 
         if has_bean_keywords:
             try:
-                # Let GPT decide whether to call the bean function
-                function_call_messages = [
-                    {
-                        "role": "system",
-                        "content": "You are a dry bean research platform. If the user asks for bean performance data, charts, or cultivar analysis, call the appropriate function."
-                    }
-                ]
-                
-                # Add conversation history for context
-                if conversation_history:
-                    function_call_messages.extend(conversation_history)
-                
-                function_call_messages.append({"role": "user", "content": question})
-                
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=function_call_messages,
-                    functions=[function_schema],
-                    function_call="auto",
-                )
-
-                choice = response.choices[0]
-                if choice.finish_reason == "function_call":
-                    call = choice.message.function_call
-                    if call.name == "query_bean_data":
-                        args = json.loads(call.arguments)
-                        args['original_question'] = question
-                        args['api_key'] = api_key
-                        
-                        preview, full_md, chart_data = answer_bean_query(args)
-                        
-                        if preview and len(preview) > 20:  # Valid response
-                            # Add transition message for research papers
-                            transition_message = "## 🔍 **Dataset Analysis Results**\n\n" + preview + "\n\n---\n\n## 📚 **Related Research Literature**\n\nSearching scientific publications for additional context and insights...\n\n"
-                        else:
-                            # Fallback to research papers with transition message
-                            transition_message = "## 🔍 **Dataset Search Results**\n\nNo specific data found in our cultivar performance dataset for this query.\n\n---\n\n## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
-                            print("🔄 Bean data insufficient, falling back to research papers...")
+                preview, full_md, chart_data, used = _route_and_answer_bean(question, q_lower, conversation_history, client, api_key)
+                if used:
+
+                    if preview and len(preview) > 20:  # Valid response
+                        # Add transition message for research papers
+                        transition_message = "## 🔍 **Dataset Analysis Results**\n\n" + preview + "\n\n---\n\n## 📚 **Related Research Literature**\n\nSearching scientific publications for additional context and insights...\n\n"
+                    else:
+                        # Fallback to research papers with transition message
+                        transition_message = "## 🔍 **Dataset Search Results**\n\nNo specific data found in our cultivar performance dataset for this query.\n\n---\n\n## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
+                        logger.debug("🔄 Bean data insufficient, falling back to research papers...")
                 else:
                     # GPT decided not to use function, add transition message
                     transition_message = "## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
                     
             except Exception as e:
-                print(f"❌ Bean data query failed: {e}")
+                logger.error("❌ Bean data query failed: %s", e)
                 # Error fallback with transition message
                 transition_message = "## 🔍 **Dataset Search**\n\nEncountered an issue accessing the cultivar dataset.\n\n---\n\n## 📚 **Research Literature Search**\n\nSearching scientific publications for relevant information...\n\n"
         else:
@@ -742,88 +919,40 @@ def answer_question(question: str, conversation_history: List[Dict] = None, api_
         transition_message = ""
 
     # --- RAG pipeline for research papers ---
-    print("🔬 Proceeding with research paper search...")
-    bge_vec = bge_model.encode(question, normalize_embeddings=True).tolist()
-    pub_vec = embed_query_pubmedbert(question)
+    logger.debug("🔬 Proceeding with research paper search...")
+    bge_vec, pub_vec = embed_question(question)
     
-    print("🔎 Querying Pinecone...")
-    bge_matches = query_pinecone(BGE_INDEX_NAME, bge_vec)
-    pub_matches = query_pinecone(PUBMEDBERT_INDEX_NAME, pub_vec)
-    print("✅ Pinecone queries completed.")
-
-    bge_scores = normalize_scores(bge_matches["matches"])
-    pub_scores = normalize_scores(pub_matches["matches"])
-    combined_scores = combine_scores(bge_scores, pub_scores)
+    logger.debug("🔎 Querying Pinecone...")
+    bge_matches, pub_matches = search_indexes(bge_vec, pub_vec)
+    logger.debug("✅ Pinecone queries completed.")
 
-    top_sources = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)[:TOP_K]
-    top_dois = [src for src, _ in top_sources]
-    print("🔎 Top DOIs from Pinecone:", top_dois)
+    top_dois = rank_sources(bge_matches, pub_matches)
+    logger.debug("🔎 Top DOIs from Pinecone: %s", top_dois)
 
     combined_context, confirmed_dois = get_rag_context_from_dois(top_dois)
     if not combined_context.strip():
-        print("⚠️ No RAG matches found for top DOIs.")
+        logger.warning("⚠️ No RAG matches found for top DOIs.")
         return "No matching papers found in RAG corpus.", top_dois, [], ""
 
     final_answer = query_openai(combined_context, top_dois, question, conversation_history, api_key)
-    print("✅ Generated answer with context.")
+    logger.debug("✅ Generated answer with context.")
 
     # Add transition message if needed
     if transition_message:
         final_answer = transition_message + final_answer
 
+    # Skip the LLM-backed extraction when the answer cannot contain a gene name
+    if not has_gene_like_token(final_answer):
+        logger.debug("🧬 No gene-like tokens in answer, skipping gene extraction.")
+        return final_answer, confirmed_dois, [], ""
+
     # Extract genes from the complete answer
-    print("🧬 Extracting gene mentions...")
+    logger.debug("🧬 Extracting gene mentions...")
     gene_mentions, db_hits, gpt_hits = extract_gene_mentions(final_answer)
-    print(f"Found gene mentions: {gene_mentions}")
+    logger.debug("Found gene mentions: %s", gene_mentions)
 
     # Map genes to their summaries with preview URLs
-    gene_summaries = []
-    for gene in gene_mentions:
-        possible_flag = False
-        gene_info = map_to_gene_id(gene)
-        if gene_info:
-            if gene_info["source"] == "NCBI":
-                preview_url = f"https://www.ncbi.nlm.nih.gov/gene/{gene_info['gene_id']}"
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"![NCBI Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
-                    "link": preview_url,
-                    "source": "NCBI Gene Database",
-                    "description": gene_info['description']
-                })
-            elif gene_info["source"] == "UniProt":
-                preview_url = f"https://www.uniprot.org/uniprotkb/{gene_info['entry']}"
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"![UniProt Preview](https://api.screenshotmachine.com/?key=demo&url={preview_url}&dimension=400x300)",
-                    "link": preview_url,
-                    "source": "UniProt Protein Database",
-                    "description": gene_info['description']
-                })
-            elif gene_info["source"] == "GPT-4o":
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"- {gene_info['description']}\n- Generated by AI analysis",
-                    "source": "AI Analysis",
-                    "description": gene_info['description'],
-                    "generated": True
-                })
-            else:
-                gene_summaries.append({
-                    "name": gene,
-                    "summary": f"- Description: `{gene_info['description']}`\n- Source: {gene_info['source']}",
-                    "source": gene_info['source'],
-                    "description": gene_info['description']
-                })
-        else:
-            # Gene identified but not found in any database
-            gene_summaries.append({
-                "name": gene,
-                "summary": f"- Genetic element mentioned in context\n- No database match found",
-                "source": "Literature Reference",
-                "description": f"This genetic element was identified in the research context but could not be matched to existing databases.",
-                "not_found": True
-            })
-
-    print(f"✅ Gene extraction completed. Found {len(gene_summaries)} genes.")
+    gene_summaries = process_genes_batch(gene_mentions)
+
+    logger.debug("✅ Gene extraction completed. Found %d genes.", len(gene_summaries))
     return final_answer, confirmed_dois, gene_summaries, "" 
\ No newline at end of file
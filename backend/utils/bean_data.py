@@ -4,8 +4,10 @@ Replaces all the complex chart type logic with GPT-4o intelligence.
 """
 
 import pandas as pd
+import copy
 import re
 import os
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 import json
 import numpy as np
@@ -16,6 +18,9 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
 MERGED_DATA_PATH = os.getenv("MERGED_DATA_PATH", os.path.join(PROJECT_ROOT, "data", "Merged_Bean_Dataset.xlsx"))
 
+# Low-cardinality label columns stored as pandas categoricals
+CATEGORICAL_COLUMNS = ("Cultivar Name", "Location", "bean_type", "trial_group")
+
 # ---- Load merged dataset ----
 def load_all_trials() -> pd.DataFrame:
     """Load the bean trial data from Excel."""
@@ -36,6 +41,11 @@ def load_all_trials() -> pd.DataFrame:
         if 'trial_group' in df.columns:
             df['trial_group'] = df['trial_group'].astype(str).str.lower()
 
+        # Repeated labels are stored as categories so grouping and comparisons work on integer codes
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+
         print(f"Loaded {len(df)} rows from {MERGED_DATA_PATH}")
         return df
     except FileNotFoundError:
@@ -48,6 +58,87 @@ def load_all_trials() -> pd.DataFrame:
 # Load the full dataset once when the module is imported
 df_trials = load_all_trials()
 
+def _distinct(column: str) -> np.ndarray:
+    if column not in df_trials.columns:
+        return np.array([], dtype=object)
+    # np.asarray so categorical columns also yield a plain array of values
+    return np.asarray(df_trials[column].dropna().unique())
+
+# Distinct cultivars, locations and years, computed once per load instead of rescanning columns per query
+UNIQUE_CULTIVARS = _distinct("Cultivar Name")
+UNIQUE_CULTIVARS_SERIES = pd.Series(UNIQUE_CULTIVARS, dtype=object)
+UNIQUE_LOCATIONS = _distinct("Location")
+UNIQUE_LOCATIONS_SET = frozenset(UNIQUE_LOCATIONS)
+UNIQUE_YEARS = sorted(_distinct("Year"))
+UNIQUE_YEARS_SET = frozenset(UNIQUE_YEARS)
+
+# Pre-rendered "available options" text for validation and clarification messages
+CULTIVARS_PREVIEW_TEXT = ', '.join([str(c) for c in UNIQUE_CULTIVARS[:10]])
+LOCATIONS_TEXT = ', '.join(map(str, UNIQUE_LOCATIONS))
+YEAR_RANGE_TEXT = f"{UNIQUE_YEARS[0]}-{UNIQUE_YEARS[-1]}" if UNIQUE_YEARS else ""
+
+def _build_cultivar_matcher() -> Tuple[Optional[re.Pattern], Dict[str, List[int]]]:
+    """Compile one pattern over every cultivar name and its words longer than 3 letters.
+
+    Returns the pattern and a map from matched token to the positions of its cultivars in UNIQUE_CULTIVARS.
+    """
+    token_ranks: Dict[str, List[int]] = {}
+    for rank, cultivar in enumerate(UNIQUE_CULTIVARS):
+        cultivar_lower = str(cultivar).lower()
+        tokens = {cultivar_lower} | {word for word in cultivar_lower.split() if len(word) > 3}
+        for token in tokens:
+            token_ranks.setdefault(token, []).append(rank)
+    if not token_ranks:
+        return None, token_ranks
+    alternation = "|".join(re.escape(token) for token in sorted(token_ranks, key=len, reverse=True))
+    # Zero-width match so tokens starting at every word position are found, longest first
+    return re.compile(rf"(?<!\w)(?=({alternation})(?!\w))"), token_ranks
+
+CULTIVAR_TOKEN_RE, CULTIVAR_TOKEN_RANKS = _build_cultivar_matcher()
+
+def cultivars_matching(pattern: str) -> np.ndarray:
+    """Distinct cultivars whose name contains pattern (case-insensitive), in dataset order."""
+    mask = UNIQUE_CULTIVARS_SERIES.str.contains(pattern, case=False, na=False).to_numpy(dtype=bool)
+    return UNIQUE_CULTIVARS[mask]
+
+def _build_cultivar_summaries() -> Dict:
+    """Per-cultivar trial statistics for the whole dataset, from a single groupby pass."""
+    if 'Cultivar Name' not in df_trials.columns:
+        return {}
+    stats = df_trials.groupby('Cultivar Name', sort=False, observed=True).agg(
+        records=('Yield', 'size'),
+        yield_mean=('Yield', 'mean'),
+        yield_min=('Yield', 'min'),
+        yield_max=('Yield', 'max'),
+        maturity_mean=('Maturity', 'mean'),
+        years=('Year', lambda years: ', '.join(map(str, sorted(years.unique())))),
+        locations=('Location', lambda locations: ', '.join(locations.dropna().astype(str).unique())),
+    )
+    columns = list(stats.columns)
+    return {name: dict(zip(columns, values)) for name, *values in stats.itertuples(name=None)}
+
+CULTIVAR_SUMMARIES = _build_cultivar_summaries()
+
+# Row positions of each cultivar's trials, so per-cultivar slices skip a full-column equality scan
+CULTIVAR_ROW_POSITIONS = (
+    df_trials.groupby('Cultivar Name', sort=False, observed=True).indices if 'Cultivar Name' in df_trials.columns else {}
+)
+
+# Text-only bean analyses kept for repeated questions
+BEAN_QUERY_CACHE_SIZE = 512
+
+# Substring match for an explicit chart/visualization request
+CHART_REQUEST_RE = re.compile("|".join(map(re.escape, [
+    "visualization", "visualize", "generate", "show me", "create", "chart", "graph", "plot",
+])))
+
+# Ambiguous references, compiled once as a single alternation
+AMBIGUOUS_REFERENCE_RE = re.compile(
+    r'\b(?:this|that|these|those)\s+\w+'  # "this cultivar", "that location"
+    r'|\bit\b'  # standalone "it"
+    r'|\bthe\s+(?:one|same|previous|last|first)\b'  # "the same", "the previous"
+)
+
 def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
     """
     SIMPLIFIED VERSION: Analyze bean data with optional chart generation.
@@ -58,66 +149,74 @@ def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
     if df_trials.empty:
         return "Bean trial data could not be loaded.", "", {}
 
+    # Generated charts differ run to run, but text-only analyses are a pure function of question and filters
+    question_lower = args.get("original_question", "").lower()
+    if CHART_REQUEST_RE.search(question_lower) and args.get('api_key'):
+        return _run_bean_query(args)
+
+    cache_key = tuple(sorted(
+        (param, value) for param, value in args.items() if param not in ("original_question", "api_key")
+    ))
+    try:
+        hash(cache_key)
+    except TypeError:
+        # Unhashable argument values from the function call; analyze without caching
+        return _run_bean_query(args)
+    preview, full_md, chart_data = _cached_bean_query(question_lower, cache_key)
+    # The cached tuple is shared across requests, so callers get their own chart payload to modify
+    return preview, full_md, copy.deepcopy(chart_data)
+
+@lru_cache(maxsize=BEAN_QUERY_CACHE_SIZE)
+def _cached_bean_query(question_lower: str, cache_key: Tuple) -> Tuple[str, str, Dict]:
+    return _run_bean_query({**dict(cache_key), "original_question": question_lower})
+
+def _run_bean_query(args: Dict) -> Tuple[str, str, Dict]:
     # Extract API key for chart generation
     api_key = args.get('api_key')
-    if not api_key:
-        print("⚠️ No API key provided for chart generation")
 
     # Debug: Print the arguments received
     print(f"🔍 Bean query args received: {args}")
     
     # NO FILTERING - Pass full dataset to GPT always
-    df = df_trials.copy()
+    # Analysis below only reads the frame, so use the shared dataset without copying it
+    df = df_trials
     print(f"📊 Passing FULL dataset to GPT: {len(df)} rows")
 
     # Get the original question for analysis
     original_question = args.get("original_question", "")
+    question_lower = original_question.lower()
+
+    # Decide up front whether a chart will actually be generated, so chart-only work can be skipped otherwise
+    wants_chart = CHART_REQUEST_RE.search(question_lower) is not None
+    will_generate_chart = wants_chart and bool(api_key)
+    if wants_chart and not api_key:
+        print("⚠️ No API key provided for chart generation")
     
     # Add analysis details based on the question - dynamically detect cultivar names
-    def find_mentioned_cultivars(question_text, df):
+    def find_mentioned_cultivars(question_lower):
         """Find cultivar names mentioned in the question by checking against actual dataset."""
-        mentioned_cultivars = []
-        question_lower = question_text.lower()
-        
-        # Get unique cultivar names from the dataset
-        unique_cultivars = df['Cultivar Name'].dropna().unique()
-        
-        for cultivar in unique_cultivars:
-            # Convert to string first (in case cultivar names are integers)
-            cultivar_str = str(cultivar)
-            cultivar_lower = cultivar_str.lower()
-            cultivar_words = cultivar_lower.split()
-            
-            # Check if the full cultivar name or key parts are mentioned
-            if (cultivar_lower in question_lower or 
-                any(word in question_lower for word in cultivar_words if len(word) > 3)):
-                mentioned_cultivars.append(cultivar)
+        # Too short to name a cultivar
+        if CULTIVAR_TOKEN_RE is None or len(question_lower) < 4:
+            return []
         
-        return mentioned_cultivars
+        # One scan for the full cultivar names and their key words; keep dataset order
+        ranks = {
+            rank
+            for match in CULTIVAR_TOKEN_RE.finditer(question_lower)
+            for rank in CULTIVAR_TOKEN_RANKS[match.group(1)]
+        }
+        return [UNIQUE_CULTIVARS[rank] for rank in sorted(ranks)]
     
-    mentioned_cultivars = find_mentioned_cultivars(original_question, df)
+    mentioned_cultivars = find_mentioned_cultivars(question_lower)
     
     # General dynamic disambiguation system
-    def detect_and_resolve_ambiguity(question, args, df):
+    def detect_and_resolve_ambiguity(question_lower, args, df):
         """
         Detect ambiguous references and attempt to resolve them using context.
         Returns (resolved_entities, needs_clarification, clarification_message)
         """
-        import re
-        
         # Detect potential ambiguous patterns dynamically
-        ambiguous_patterns = [
-            r'\b(this|that|these|those)\s+(\w+)',  # "this cultivar", "that location"
-            r'\bit\b',  # standalone "it"
-            r'\bthe\s+(one|same|previous|last|first)\b',  # "the same", "the previous"
-        ]
-        
-        found_ambiguous = []
-        for pattern in ambiguous_patterns:
-            matches = re.findall(pattern, question.lower())
-            found_ambiguous.extend(matches)
-        
-        if not found_ambiguous:
+        if not AMBIGUOUS_REFERENCE_RE.search(question_lower):
             return {}, False, ""
         
         # Try to resolve using function parameters (GPT's interpretation)
@@ -131,23 +230,20 @@ def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
         if resolved_params:
             for param, value in resolved_params.items():
                 if param == 'cultivar':
-                    if not df[df['Cultivar Name'].str.contains(str(value), case=False, na=False)].empty:
+                    if len(cultivars_matching(str(value))) > 0:
                         continue
                     else:
-                        available = df['Cultivar Name'].dropna().unique()
-                        validation_errors.append(f"Cultivar '{value}' not found. Available: {', '.join([str(c) for c in available[:10]])}")
+                        validation_errors.append(f"Cultivar '{value}' not found. Available: {CULTIVARS_PREVIEW_TEXT}")
                 elif param == 'location':
-                    if str(value).upper() in df['Location'].unique():
+                    if str(value).upper() in UNIQUE_LOCATIONS_SET:
                         continue
                     else:
-                        available = df['Location'].dropna().unique()
-                        validation_errors.append(f"Location '{value}' not found. Available: {', '.join(available)}")
+                        validation_errors.append(f"Location '{value}' not found. Available: {LOCATIONS_TEXT}")
                 elif param == 'year':
-                    if int(value) in df['Year'].dropna().unique():
+                    if int(value) in UNIQUE_YEARS_SET:
                         continue
                     else:
-                        available = sorted(df['Year'].dropna().unique())
-                        validation_errors.append(f"Year {value} not found. Available: {min(available)}-{max(available)}")
+                        validation_errors.append(f"Year {value} not found. Available: {YEAR_RANGE_TEXT}")
         
         if validation_errors:
             clarification = "**🤔 Reference Issue:**\n\n" + "\n".join(validation_errors) + "\n\n"
@@ -157,44 +253,36 @@ def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
             return resolved_params, False, ""
         
         # If no parameters resolved, ask for clarification
-        clarification = "**🤔 Clarification Needed:**\n\n"
-        clarification += "Your question contains ambiguous references that I need help understanding. "
-        clarification += "Could you please be more specific?\n\n"
-        
-        # Provide context-aware suggestions based on available data
-        clarification += "**Available options:**\n"
+        parts = [
+            "**🤔 Clarification Needed:**\n\n",
+            "Your question contains ambiguous references that I need help understanding. ",
+            "Could you please be more specific?\n\n",
+            # Provide context-aware suggestions based on available data
+            "**Available options:**\n",
+        ]
         if 'Cultivar Name' in df.columns:
-            cultivars = df['Cultivar Name'].dropna().unique()
-            clarification += f"• **Cultivars:** {', '.join([str(c) for c in cultivars[:10]])}\n"
+            parts.append(f"• **Cultivars:** {CULTIVARS_PREVIEW_TEXT}\n")
         if 'Location' in df.columns:
-            locations = df['Location'].dropna().unique()
-            clarification += f"• **Locations:** {', '.join(locations)}\n"
+            parts.append(f"• **Locations:** {LOCATIONS_TEXT}\n")
         if 'Year' in df.columns:
-            years = sorted(df['Year'].dropna().unique())
-            clarification += f"• **Years:** {min(years)}-{max(years)}\n"
+            parts.append(f"• **Years:** {YEAR_RANGE_TEXT}\n")
         
-        clarification += "\n**Example:** Instead of 'plot this cultivar', try 'plot Dynasty yield over time'\n\n"
+        parts.append("\n**Example:** Instead of 'plot this cultivar', try 'plot Dynasty yield over time'\n\n")
         
-        return {}, True, clarification
+        return {}, True, "".join(parts)
     
     # Apply general disambiguation BEFORE chart generation
-    resolved_entities, needs_clarification, clarification_msg = detect_and_resolve_ambiguity(original_question, args, df)
+    resolved_entities, needs_clarification, clarification_msg = detect_and_resolve_ambiguity(question_lower, args, df)
     
     if needs_clarification:
-        response = f"## 📊 **Bean Data Analysis Results**\n\n"
-        response += clarification_msg
-        return response, "", {}
+        return "## 📊 **Bean Data Analysis Results**\n\n" + clarification_msg, "", {}
                 
     # Update mentioned_cultivars based on resolved entities
     if 'cultivar' in resolved_entities and not mentioned_cultivars:
-        cultivar_matches = df[df['Cultivar Name'].str.contains(resolved_entities['cultivar'], case=False, na=False)]['Cultivar Name'].unique()
+        cultivar_matches = cultivars_matching(resolved_entities['cultivar'])
         if len(cultivar_matches) > 0:
             mentioned_cultivars = [cultivar_matches[0]]
     
-    # Check if user explicitly wants a chart/visualization
-    chart_keywords = ["chart", "plot", "graph", "visualization", "visualize", "show me", "create", "generate"]
-    wants_chart = any(keyword in original_question.lower() for keyword in chart_keywords)
-    
     # Extract basic analysis parameters
     analysis_type = args.get("analysis_type", "analysis")
     analysis_column = args.get("analysis_column", "Yield")
@@ -203,7 +291,7 @@ def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
     # CONDITIONAL CHART GENERATION - Only if explicitly requested
     chart_data = {}
     
-    if wants_chart and api_key and len(df) > 0:
+    if will_generate_chart:
         print("🎯 Chart explicitly requested - generating visualization")
         
         # Build enhanced prompt with resolved context
@@ -229,54 +317,59 @@ def answer_bean_query(args: Dict) -> Tuple[str, str, Dict]:
         else:
             chart_prompt = f"User request: {original_question}. {context_str}. Create the most appropriate visualization based on this request. Handle all filtering, grouping, and styling as needed."
         
-        chart_data = create_smart_chart(df, chart_prompt, api_key, context_str)
+        # The generated chart code runs with df in scope and may modify it, so it gets its own copy,
+        # with plain object labels so assigning new values to those columns works as on the raw sheet
+        chart_df = df.astype({col: object for col in CATEGORICAL_COLUMNS if col in df.columns})
+        chart_data = create_smart_chart(chart_df, chart_prompt, api_key, context_str)
     elif wants_chart:
         print("🎯 Chart requested but no API key available")
     else:
         print("📝 No chart requested - providing data analysis only")
 
-    # Build response focused on data analysis
-    response = f"## 📊 **Bean Data Analysis Results**\n\n"
+    # Build response focused on data analysis; collect parts and join once
+    parts = ["## 📊 **Bean Data Analysis Results**\n\n"]
     
     for cultivar_name in mentioned_cultivars:
-        cultivar_data = df[df['Cultivar Name'] == cultivar_name]
-        if not cultivar_data.empty:
-            response += f"**{cultivar_name} Variety Analysis:**\n"
-            response += f"- Found {len(cultivar_data)} records for {cultivar_name} variety\n"
-            response += f"- Average yield: {cultivar_data['Yield'].mean():.1f} kg/ha\n"
-            response += f"- Yield range: {cultivar_data['Yield'].min():.1f} - {cultivar_data['Yield'].max():.1f} kg/ha\n"
-            response += f"- Average maturity: {cultivar_data['Maturity'].mean():.1f} days\n"
-            response += f"- Years tested: {', '.join(map(str, sorted(cultivar_data['Year'].unique())))}\n"
-            response += f"- Locations tested: {', '.join(cultivar_data['Location'].unique())}\n\n"
+        summary = CULTIVAR_SUMMARIES.get(cultivar_name)
+        if summary is not None:
+            parts.append(
+                f"**{cultivar_name} Variety Analysis:**\n"
+                f"- Found {summary['records']} records for {cultivar_name} variety\n"
+                f"- Average yield: {summary['yield_mean']:.1f} kg/ha\n"
+                f"- Yield range: {summary['yield_min']:.1f} - {summary['yield_max']:.1f} kg/ha\n"
+                f"- Average maturity: {summary['maturity_mean']:.1f} days\n"
+                f"- Years tested: {summary['years']}\n"
+                f"- Locations tested: {summary['locations']}\n\n"
+            )
     
     if wants_chart:
-        response += f"**Visualization:** {'Chart generated based on your request' if chart_data else 'Chart generation requested but unavailable'}\n\n"
+        parts.append(f"**Visualization:** {'Chart generated based on your request' if chart_data else 'Chart generation requested but unavailable'}\n\n")
     else:
-        response += f"**Analysis Type:** Data analysis (no visualization requested)\n\n"
+        parts.append("**Analysis Type:** Data analysis (no visualization requested)\n\n")
 
     # Show a small sample of relevant data
-    response += "### 📋 **Sample Data:**\n\n"
+    parts.append("### 📋 **Sample Data:**\n\n")
     display_cols = [c for c in ["Year", "Location", "Cultivar Name", "Yield", "Maturity", "bean_type"] if c in df.columns]
     if display_cols:
         # Show relevant data if specific cultivar mentioned, otherwise general sample
         if mentioned_cultivars:
             # Use the first mentioned cultivar for sample data
             cultivar_name = mentioned_cultivars[0]
-            cultivar_data = df[df['Cultivar Name'] == cultivar_name]
-            if not cultivar_data.empty:
-                sample_df = cultivar_data[display_cols].head(5)
-                response += sample_df.to_markdown(index=False)
-                response += f"\n\n*Showing {cultivar_name} variety data ({len(sample_df)} of {len(cultivar_data)} {cultivar_name} records)*"
+            positions = CULTIVAR_ROW_POSITIONS.get(cultivar_name)
+            if positions is not None and len(positions) > 0:
+                sample_df = df.iloc[positions[:5]][display_cols]
+                parts.append(sample_df.to_markdown(index=False))
+                parts.append(f"\n\n*Showing {cultivar_name} variety data ({len(sample_df)} of {len(positions)} {cultivar_name} records)*")
             else:
                 sample_df = df[display_cols].head(5)
-                response += sample_df.to_markdown(index=False)
-                response += f"\n\n*Sample data from available records*"
+                parts.append(sample_df.to_markdown(index=False))
+                parts.append("\n\n*Sample data from available records*")
         else:
             sample_df = df[display_cols].head(5)
-            response += sample_df.to_markdown(index=False)
-            response += f"\n\n*Sample data from available records*"
+            parts.append(sample_df.to_markdown(index=False))
+            parts.append("\n\n*Sample data from available records*")
     
-    return response, "", chart_data
+    return "".join(parts), "", chart_data
                         
 # ---- GPT-compatible JSON Schema (unchanged) ----
 function_schema = {
@@ -0,0 +1,57 @@
+"""
+Micro-batching for query embeddings.
+Concurrent requests are coalesced so the encoder runs one forward pass per batch.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Sequence
+
+class EmbeddingBatcher:
+    """Collect queries from concurrent callers and embed them together on a worker thread."""
+
+    def __init__(self, embed_batch: Callable[[List[str]], Sequence], max_batch: int = 32, window_s: float = 0.005):
+        self._embed_batch = embed_batch
+        self._max_batch = max_batch
+        self._window_s = window_s
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, query: str) -> Future:
+        """Queue a query and return a future resolving to its embedding."""
+        future: Future = Future()
+        self._queue.put((query, future))
+        return future
+
+    def embed(self, query: str):
+        return self.submit(query).result()
+
+    def _collect(self) -> list:
+        # Block for the first request, then wait briefly for others to join the batch
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window_s
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                vectors = self._embed_batch([query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
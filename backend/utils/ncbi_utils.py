@@ -2,15 +2,15 @@ import re
 import pandas as pd
 from typing import List, Dict, Optional
 import json
-from openai import OpenAI
 import os
+from .openai_client import get_openai_client
 
 # Global gene databases
 GENE_DB = None
 UNIPROT_DB = None
 
 # Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_openai_client(os.getenv("OPENAI_API_KEY"))
 
 def load_gene_db(path: str):
     """Load the NCBI gene database from Excel file."""
@@ -120,8 +120,45 @@ def is_gene_in_databases(gene_name: str) -> bool:
     
     return False
 
-def map_to_gene_id(gene_name: str) -> Optional[Dict]:
-    """Map a gene name to its NCBI entry first, then UniProt entry if not found."""
+def _ncbi_entry(gene_name: str, row) -> Dict:
+    return {
+        "name": gene_name,
+        "description": str(row.get('GeneID', 'Unknown')),
+        "source": "NCBI",
+        "gene_id": str(row.get('GeneID', 'Unknown')),
+        "symbol": str(row.get('Symbol', gene_name))
+    }
+
+def map_to_gene_ids(gene_names: List[str]) -> Dict[str, Optional[Dict]]:
+    """Resolve exact and case-insensitive NCBI symbol matches for many genes in one pass.
+
+    Genes without such a match map to None; callers fall back to find_partial_gene_match for those.
+    """
+    if GENE_DB is None:
+        raise ValueError("Gene database not loaded. Call load_gene_db() first.")
+
+    symbols = GENE_DB['Symbol']
+    lowered = symbols.str.lower()
+    exact_rows = GENE_DB[symbols.isin(gene_names)].drop_duplicates('Symbol')
+    exact = {row['Symbol']: row for _, row in exact_rows.iterrows()}
+    lower_names = {name.lower() for name in gene_names}
+    ci_rows = GENE_DB.assign(symbol_lower=lowered)[lowered.isin(lower_names)].drop_duplicates('symbol_lower')
+    case_insensitive = {row['symbol_lower']: row for _, row in ci_rows.iterrows()}
+
+    results = {}
+    for name in gene_names:
+        row = exact.get(name)
+        if row is None:
+            row = case_insensitive.get(name.lower())
+        results[name] = _ncbi_entry(name, row) if row is not None else None
+    return results
+
+def map_to_gene_id(gene_name: str, use_gpt_fallback: bool = True) -> Optional[Dict]:
+    """Map a gene name to its NCBI entry first, then UniProt entry if not found.
+
+    With use_gpt_fallback=False, genes missing from both databases return None so the
+    caller can describe them in a single batched GPT call.
+    """
     if GENE_DB is None:
         raise ValueError("Gene database not loaded. Call load_gene_db() first.")
     
@@ -129,44 +166,39 @@ def map_to_gene_id(gene_name: str) -> Optional[Dict]:
     # Try exact match first
     exact_match = GENE_DB[GENE_DB['Symbol'] == gene_name]
     if not exact_match.empty:
-        row = exact_match.iloc[0]
-        return {
-            "name": gene_name,
-            "description": str(row.get('GeneID', 'Unknown')),
-            "source": "NCBI",
-            "gene_id": str(row.get('GeneID', 'Unknown')),
-            "symbol": str(row.get('Symbol', gene_name))
-        }
+        return _ncbi_entry(gene_name, exact_match.iloc[0])
     
     # Try case-insensitive match
     case_insensitive = GENE_DB[GENE_DB['Symbol'].str.lower() == gene_name.lower()]
     if not case_insensitive.empty:
-        row = case_insensitive.iloc[0]
-        return {
-            "name": gene_name,
-            "description": str(row.get('GeneID', 'Unknown')),
-            "source": "NCBI",
-            "gene_id": str(row.get('GeneID', 'Unknown')),
-            "symbol": str(row.get('Symbol', gene_name))
-        }
+        return _ncbi_entry(gene_name, case_insensitive.iloc[0])
+    
+    gene_info = find_partial_gene_match(gene_name)
+    if gene_info is not None:
+        return gene_info
+    
+    # If not found in either database, generate description with GPT-4o
+    return generate_gene_description_with_gpt(gene_name) if use_gpt_fallback else None
+
+def find_partial_gene_match(gene_name: str) -> Optional[Dict]:
+    """Look a gene up by partial NCBI symbol match, then in UniProt.
+
+    Covers the steps after the exact and case-insensitive symbol lookups, so genes that
+    map_to_gene_ids already missed aren't searched for again.
+    """
+    if GENE_DB is None:
+        raise ValueError("Gene database not loaded. Call load_gene_db() first.")
     
     # Try partial match (escape regex special characters)
     escaped_gene_name = re.escape(gene_name)
     partial_match = GENE_DB[GENE_DB['Symbol'].str.contains(escaped_gene_name, case=False, na=False, regex=True)]
     if not partial_match.empty:
-        row = partial_match.iloc[0]
-        return {
-            "name": gene_name,
-            "description": str(row.get('GeneID', 'Unknown')),
-            "source": "NCBI",
-            "gene_id": str(row.get('GeneID', 'Unknown')),
-            "symbol": str(row.get('Symbol', gene_name))
-        }
+        return _ncbi_entry(gene_name, partial_match.iloc[0])
     
     # Step 2: If not found in NCBI, try UniProt database
     if UNIPROT_DB is None:
         print("⚠️ UniProt database not loaded, skipping UniProt lookup")
-        return generate_gene_description_with_gpt(gene_name)
+        return None
     
     # Get all columns except the first one (Entry column)
     search_columns = UNIPROT_DB.columns[1:].tolist()
@@ -201,8 +233,7 @@ def map_to_gene_id(gene_name: str) -> Optional[Dict]:
                 "matched_value": str(row[column])
             }
     
-    # If not found in either database, generate description with GPT-4o
-    return generate_gene_description_with_gpt(gene_name)
+    return None
 
 def generate_gene_description_with_gpt(gene_name: str) -> Optional[Dict]:
     """Generate a brief description for a gene using GPT-4o when not found in databases."""
@@ -239,4 +270,62 @@ def generate_gene_description_with_gpt(gene_name: str) -> Optional[Dict]:
         
     except Exception as e:
         print(f"❌ Error generating description for {gene_name}: {e}")
-        return None 
\ No newline at end of file
+        return None 
+
+def generate_gene_descriptions_with_gpt(gene_names: List[str]) -> Dict[str, Optional[Dict]]:
+    """Describe several genes missing from the databases with one GPT-4o call.
+
+    Falls back to one call per gene if the batched response cannot be parsed.
+    """
+    if not gene_names:
+        return {}
+    if len(gene_names) == 1:
+        return {gene_names[0]: generate_gene_description_with_gpt(gene_names[0])}
+
+    try:
+        prompt = f"""
+        Provide a brief, scientific description for each of the following genes or molecular markers in the context of plant biology, specifically dry beans (Phaseolus vulgaris) if applicable:
+        {json.dumps(gene_names)}
+
+        For each one include:
+        - What type of gene/protein it is
+        - Its primary function or role
+        - Relevance to plant biology or agriculture (if any)
+
+        Keep each description concise (2-3 sentences max). If a name doesn't appear to be a real gene name, indicate that it may be a gene identifier or locus name.
+        Return only a JSON array of description strings, in the same order as the names above.
+        """
+
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": "You are a plant genetics expert. Provide accurate, concise gene descriptions."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,
+            max_tokens=150 * len(gene_names)
+        )
+
+        raw_output = response.choices[0].message.content.strip()
+        if raw_output.startswith("```"):
+            raw_output = raw_output.strip("`").strip()
+            if raw_output.lower().startswith("json"):
+                raw_output = raw_output[4:].strip()
+
+        descriptions = json.loads(raw_output)
+        if not isinstance(descriptions, list) or len(descriptions) != len(gene_names):
+            raise ValueError(f"expected {len(gene_names)} descriptions, got {raw_output[:200]}")
+
+        return {
+            name: {
+                "name": name,
+                "description": str(description).strip(),
+                "source": "GPT-4o",
+                "generated": True
+            }
+            for name, description in zip(gene_names, descriptions)
+        }
+
+    except Exception as e:
+        print(f"❌ Batched gene description failed, describing genes one by one: {e}")
+        return {name: generate_gene_description_with_gpt(name) for name in gene_names}
@@ -0,0 +1,21 @@
+"""
+Shared OpenAI clients.
+Clients are reused per API key so their HTTP connection pools survive across requests.
+"""
+
+from functools import lru_cache
+
+import httpx
+from openai import OpenAI
+
+# One keep-alive HTTP/2 pool shared by every client, so TLS and TCP setup is paid once
+http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+    timeout=httpx.Timeout(60.0, connect=3.0),
+)
+
+@lru_cache(maxsize=128)
+def get_openai_client(api_key: str) -> OpenAI:
+    """Return a cached OpenAI client for the given API key."""
+    return OpenAI(api_key=api_key, http_client=http_client)
@@ -4,7 +4,6 @@ Based on the user's tested dynamic_graph_server_plotly.py approach.
 """
 
 import ast
-import json
 import re
 import traceback
 from typing import Dict
@@ -12,7 +11,7 @@ from typing import Dict
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from openai import OpenAI
+from .openai_client import get_openai_client
 
 def strip_md_fences(code: str) -> str:
     """Remove ``` fences and any explanatory text, extracting only Python code."""
@@ -58,7 +57,7 @@ def numeric_cols(df: pd.DataFrame) -> list:
 
 def ask_llm_for_plotly(prompt: str, df: pd.DataFrame, api_key: str) -> str:
     """Generate Plotly chart code using OpenAI - exactly like your tested version."""
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
     
     cols = list(df.columns)
     num_cols = numeric_cols(df)
@@ -305,8 +304,8 @@ def create_smart_chart(df: pd.DataFrame, user_request: str, api_key: str, contex
         # Execute the code to create the figure
         fig = run_generated_code(code, df)
         
-        # Convert to JSON for frontend
-        fig_json = fig.to_json()
+        # Hand the figure dict over as-is; the SSE layer serializes its numpy arrays directly
+        fig_dict = fig.to_plotly_json()
         
         # Extract title from the generated figure if available
         chart_title = "Data Visualization"
@@ -315,7 +314,7 @@ def create_smart_chart(df: pd.DataFrame, user_request: str, api_key: str, contex
         
         return {
             "type": "plotly",
-            "data": json.loads(fig_json),
+            "data": fig_dict,
             "title": chart_title,
             "generated_code": code
         }
@@ -331,7 +330,7 @@ def create_smart_chart(df: pd.DataFrame, user_request: str, api_key: str, contex
                 fixed_prompt = f"{prompt}\n\nIMPORTANT: For bar charts, DO NOT use 'size' property in marker dict. Use only 'color' and 'line' properties."
                 fixed_code = ask_llm_for_plotly(fixed_prompt, df, api_key)
                 fig = run_generated_code(fixed_code, df)
-                fig_json = fig.to_json()
+                fig_dict = fig.to_plotly_json()
                 
                 chart_title = "Data Visualization"
                 if fig.layout and fig.layout.title and fig.layout.title.text:
@@ -339,7 +338,7 @@ def create_smart_chart(df: pd.DataFrame, user_request: str, api_key: str, contex
                 
                 return {
                     "type": "plotly",
-                    "data": json.loads(fig_json),
+                    "data": fig_dict,
                     "title": chart_title,
                     "generated_code": fixed_code
                 }
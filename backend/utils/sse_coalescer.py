@@ -0,0 +1,42 @@
+"""
+Coalescing of streamed content deltas into fewer SSE frames.
+Model tokens arrive a few characters at a time; sending each as its own frame wastes
+JSON encoding and network writes, so deltas are buffered and flushed in larger pieces.
+"""
+
+import time
+from typing import List
+
+class SSECoalescer:
+    """Buffer content deltas and release them by size, age, or paragraph boundary."""
+
+    def __init__(self, max_chars: int = 128, max_delay_s: float = 0.05):
+        self._max_chars = max_chars
+        self._max_delay_s = max_delay_s
+        self._parts: List[str] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def add(self, text: str) -> List[str]:
+        """Buffer a delta and return any content that is ready to send."""
+        if not text:
+            return []
+        self._parts.append(text)
+        self._size += len(text)
+        if (
+            self._size >= self._max_chars
+            or "\n\n" in text
+            or time.monotonic() - self._last_flush >= self._max_delay_s
+        ):
+            return self.flush()
+        return []
+
+    def flush(self) -> List[str]:
+        """Return whatever is still buffered."""
+        self._last_flush = time.monotonic()
+        if not self._parts:
+            return []
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return [text]
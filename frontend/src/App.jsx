@@ -261,7 +261,7 @@ export default function App() {
           const { done, value } = await reader.read();
           if (done) break;
 
-          const chunk = decoder.decode(value);
+          const chunk = decoder.decode(value, { stream: true });
           buffer += chunk;
           const lines = buffer.split('\n');
           